@@ -1,9 +1,27 @@
+import io
 import os
+import json
+import argparse
+import itertools
+import multiprocessing
+import queue
+import re
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
 import subprocess
 import sys
 import tempfile
+import threading
+import zlib
 import configparser
-from PIL import Image
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image, features
 import ffmpeg
 import subprocess
 from PySide6.QtWidgets import (
@@ -23,28 +41,308 @@ def check_ffmpeg_installed():
         raise EnvironmentError("FFmpeg is not installed or not found in system PATH.")
 
 
+# Function to get (and create) the per-user configuration folder
+def get_config_dir():
+    if sys.platform.startswith('win'):
+        config_dir = os.path.join(os.getenv('APPDATA'), 'MediaCompressor')
+    elif sys.platform.startswith('darwin'):
+        config_dir = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'MediaCompressor')
+    else:
+        config_dir = os.path.join(os.path.expanduser('~'), '.config', 'MediaCompressor')
+    os.makedirs(config_dir, exist_ok=True)
+    return config_dir
+
+
+# Decompression-bomb limit checked on every code path that opens images. It matches
+# Pillow's own hard limit (twice Image.MAX_IMAGE_PIXELS), so large panoramas and
+# scans below it are admitted to the oversized lane instead of being refused.
+MAX_IMAGE_PIXELS = 2 * Image.MAX_IMAGE_PIXELS
+
+# Bytes per pixel of Pillow's in-memory storage (multi-band modes are padded to 4)
+IMAGE_MODE_BYTES = {
+    '1': 1, 'L': 1, 'P': 1,
+    'I;16': 2, 'I;16L': 2, 'I;16B': 2,
+    'I': 4, 'F': 4, 'LA': 4, 'La': 4, 'PA': 4,
+    'RGB': 4, 'RGBA': 4, 'RGBa': 4, 'RGBX': 4, 'CMYK': 4, 'YCbCr': 4, 'LAB': 4, 'HSV': 4
+}
+
+# Fixed per-job allowance for encoder buffers and file handles
+IMAGE_JOB_OVERHEAD = 32 * 1024 * 1024
+
+# Parallel zlib trials for PNG output; each trial thread holds its own copy of the pixels
+PNG_TRIAL_WORKERS = min(4, os.cpu_count() or 1)
+# (level, strategy) pairs; Z_RLE and Z_HUFFMAN_ONLY produce the same stream at every level
+PNG_ZLIB_TRIALS = [
+    (level, strategy)
+    for level in (6, 9)
+    for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_FIXED)
+] + [(9, zlib.Z_RLE), (9, zlib.Z_HUFFMAN_ONLY)]
+
+
+# Function to get a default RAM budget for parallel image jobs (half of physical memory)
+def default_memory_budget():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (AttributeError, ValueError, OSError):
+        return 2 * 1024 * 1024 * 1024
+
+
+# Function to reject images above the decompression-bomb limit before decoding them
+def check_image_pixels(width, height):
+    if width * height > MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"Image size ({width * height} pixels) exceeds limit of {MAX_IMAGE_PIXELS} pixels, could be decompression bomb DOS attack."
+        )
+
+
+# Function to read image dimensions and mode from the header without decoding pixels
+def read_image_header(input_path):
+    with Image.open(input_path) as img:
+        check_image_pixels(*img.size)
+        return img.size[0], img.size[1], img.mode
+
+
+# Function to get the RAM budget for image jobs from the options (memory_budget_mb), in bytes
+def get_memory_budget(options):
+    memory_budget_mb = options.get('memory_budget_mb')
+    return int(memory_budget_mb) * 1024 * 1024 if memory_budget_mb else default_memory_budget()
+
+
+# Function to estimate the peak memory compress_image needs for an image
+def estimate_image_memory(width, height, mode, output_format='jpg'):
+    pixels = width * height
+    peak = pixels * IMAGE_MODE_BYTES.get(mode, 4)
+
+    # Every path except JPEG from an already compatible mode makes a second full copy
+    output_format = output_format.lower()
+    if output_format not in ['jpg', 'jpeg'] or mode in ('RGBA', 'P'):
+        peak += pixels * 4
+    if output_format == 'png':
+        # Lossless and quantized candidates, plus a copy of each per trial thread
+        peak += pixels * (4 + 1) * (PNG_TRIAL_WORKERS + 1)
+
+    return peak + IMAGE_JOB_OVERHEAD
+
+
+# Admission Controller for Memory-Budgeted Image Jobs
+class ImageAdmissionController:
+    def __init__(self, memory_budget, oversized_fraction=0.5):
+        self.memory_budget = memory_budget
+        self.oversized_threshold = memory_budget * oversized_fraction
+        self._in_use = 0
+        self._oversized_waiting = False
+        self._condition = threading.Condition()
+        self._oversized_lane = threading.Lock()
+
+    @contextmanager
+    def admit(self, estimate):
+        """
+        Block until a job of the given estimated size fits in the budget.
+        Oversized jobs run one at a time and hold back new admissions while
+        they wait, so a steady stream of small jobs cannot starve them.
+        """
+        reserved = min(estimate, self.memory_budget)
+        oversized = estimate > self.oversized_threshold
+
+        if oversized:
+            self._oversized_lane.acquire()
+        try:
+            with self._condition:
+                if oversized:
+                    self._oversized_waiting = True
+                    self._condition.wait_for(lambda: self._in_use + reserved <= self.memory_budget)
+                    self._oversized_waiting = False
+                else:
+                    self._condition.wait_for(
+                        lambda: not self._oversized_waiting and self._in_use + reserved <= self.memory_budget
+                    )
+                self._in_use += reserved
+
+            try:
+                yield
+            finally:
+                with self._condition:
+                    self._in_use -= reserved
+                    self._condition.notify_all()
+        finally:
+            if oversized:
+                self._oversized_lane.release()
+
+
+# Function to compress one image once the admission controller has room for it; returns False if stopped first
+def compress_image_admitted(controller, input_path, output_path, target_percentage=50, png_quantize=False,
+                            should_stop=None, progress_callback=None, error_log_callback=None):
+    if should_stop and should_stop():
+        return False
+    output_format = os.path.splitext(output_path)[1][1:]
+    width, height, mode = read_image_header(input_path)
+    estimate = estimate_image_memory(width, height, mode, output_format)
+    with controller.admit(estimate):
+        if should_stop and should_stop():
+            return False
+        compress_image(
+            input_path,
+            output_path,
+            target_percentage=target_percentage,
+            output_format=output_format,
+            png_quantize=png_quantize,
+            progress_callback=progress_callback,
+            error_log_callback=error_log_callback
+        )
+    return True
+
+
+# Parallel Image Compression Function
+def compress_images_parallel(jobs, target_percentage=50, png_quantize=False, memory_budget=None, max_workers=None,
+                             should_stop=None, completion_callback=None, error_log_callback=None):
+    controller = ImageAdmissionController(memory_budget or default_memory_budget())
+
+    def run_job(input_path, output_path):
+        return compress_image_admitted(
+            controller,
+            input_path,
+            output_path,
+            target_percentage=target_percentage,
+            png_quantize=png_quantize,
+            should_stop=should_stop,
+            error_log_callback=error_log_callback
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(run_job, input_path, output_path): input_path for input_path, output_path in jobs}
+        for future in as_completed(futures):
+            input_path = futures[future]
+            try:
+                completed = future.result()
+            except Exception as e:
+                if completion_callback:
+                    completion_callback(input_path, e)
+                continue
+            if completed and completion_callback:
+                completion_callback(input_path, None)
+
+
+# Function to check that a candidate reduction decodes back to the same pixels
+def _is_lossless_reduction(original, candidate):
+    return candidate.convert(original.mode).tobytes() == original.tobytes()
+
+
+# Function to map arbitrary colours onto a palette of at most `colors` entries
+def _quantize(img, colors):
+    if features.check_feature('libimagequant'):
+        method = Image.Quantize.LIBIMAGEQUANT
+    elif img.mode == 'RGBA':
+        method = Image.Quantize.FASTOCTREE
+    else:
+        method = Image.Quantize.MEDIANCUT
+    return img.quantize(colors=colors, method=method)
+
+
+# Function to apply the lossless PNG reductions (alpha removal, grayscale, palette)
+def reduce_png(img):
+    # A tRNS colour key (info['transparency']) is turned into real alpha for every mode
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        img = img.convert('RGBA')
+    else:
+        img = img.convert('RGB')
+
+    # Drop the alpha channel when every pixel is fully opaque
+    if img.mode == 'RGBA' and img.getchannel('A').getextrema() == (255, 255):
+        img = img.convert('RGB')
+
+    # Drop to a single channel when R, G and B are identical everywhere
+    if img.mode == 'RGB':
+        gray = img.convert('L')
+        if _is_lossless_reduction(img, gray):
+            img = gray
+
+    # Palette reduction; Pillow writes 1/2/4-bit PNGs for palettes of 16 entries or fewer
+    palette_limit = 16 if img.mode == 'L' else 256
+    colors = img.getcolors(palette_limit)
+    if colors is not None:
+        source = img.convert('RGB') if img.mode == 'L' else img
+        candidate = _quantize(source, len(colors))
+        if _is_lossless_reduction(img, candidate):
+            return candidate
+
+    return img
+
+
+# Function to quantize a reduced PNG to a palette sized by the size slider
+def quantize_png(img, target_percentage):
+    if target_percentage >= 100 or img.mode not in ('RGB', 'RGBA'):
+        return None
+    max_colors = max(2, min(int(256 * (target_percentage / 100)), 256))
+    if img.getcolors(max_colors) is not None:
+        return None
+    return _quantize(img, max_colors)
+
+
+# PNG Optimization Function
+def optimize_png(img, target_percentage=100, quantize=False, max_workers=None):
+    # Strip metadata (text chunks, EXIF, timestamps, DPI) but keep the colour profile
+    icc_profile = img.info.get('icc_profile')
+
+    # Output stays lossless unless quantization is asked for; dithered palettes can
+    # compress worse than the lossless image, so both are tried
+    candidates = [reduce_png(img)]
+    quantized = quantize_png(candidates[0], target_percentage) if quantize else None
+    if quantized is not None:
+        candidates.append(quantized)
+    for candidate in candidates:
+        candidate.info = {}
+
+    params = [{'optimize': True}]
+    params += [
+        {'compress_level': level, 'compress_type': strategy}
+        for level, strategy in PNG_ZLIB_TRIALS
+    ]
+    trials = [(index, trial_params) for index in range(len(candidates)) for trial_params in params]
+
+    # Pillow stores encoder settings on the image while saving, so every thread encodes its own copies
+    local = threading.local()
+
+    def run_trial(trial):
+        index, trial_params = trial
+        copies = local.__dict__.setdefault('copies', {})
+        if index not in copies:
+            copies[index] = candidates[index].copy()
+        buffer = io.BytesIO()
+        copies[index].save(buffer, format='PNG', icc_profile=icc_profile, **trial_params)
+        return buffer.getvalue()
+
+    with ThreadPoolExecutor(max_workers=max_workers or PNG_TRIAL_WORKERS) as executor:
+        results = list(executor.map(run_trial, trials))
+
+    return min(results, key=len)
+
+
+# Function to encode an already opened image with the encoder for the output format
+def save_image(img, output_path, target_percentage=50, output_format='jpg', png_quantize=False):
+    output_format = output_format.lower()
+
+    if output_format in ['jpg', 'jpeg']:
+        if img.mode in ('RGBA', 'P'):
+            img = img.convert("RGB")
+        quality = int(95 * (target_percentage / 100))
+        quality = max(5, min(quality, 95))
+        img.save(output_path, format='JPEG', quality=quality)
+    elif output_format == 'png':
+        data = optimize_png(img, target_percentage, quantize=png_quantize)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+    elif output_format == 'webp':
+        img.save(output_path, format='WEBP', quality=int(100 * (target_percentage / 100)))
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+
 # Image Compression Function
-def compress_image(input_path, output_path, target_percentage=50, output_format='jpg', progress_callback=None, error_log_callback=None):
+def compress_image(input_path, output_path, target_percentage=50, output_format='jpg', png_quantize=False, progress_callback=None, error_log_callback=None):
     try:
         with Image.open(input_path) as img:
-            output_format = output_format.lower()
-
-            if output_format in ['jpg', 'jpeg']:
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert("RGB")
-                quality = int(95 * (target_percentage / 100))
-                quality = max(5, min(quality, 95))
-                img.save(output_path, format='JPEG', quality=quality)
-            elif output_format == 'png':
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert("RGBA")
-                else:
-                    img = img.convert("RGB")
-                img.save(output_path, format='PNG', optimize=True)
-            elif output_format == 'webp':
-                img.save(output_path, format='WEBP', quality=int(100 * (target_percentage / 100)))
-            else:
-                raise ValueError(f"Unsupported output format: {output_format}")
+            check_image_pixels(*img.size)
+            save_image(img, output_path, target_percentage, output_format, png_quantize)
 
             if progress_callback:
                 progress_callback(1.0)
@@ -55,8 +353,185 @@ def compress_image(input_path, output_path, target_percentage=50, output_format=
         raise e
 
 
+# Video bitrate clamps applied to every encode (bits per second)
+MIN_VIDEO_BITRATE = 100000
+MAX_VIDEO_BITRATE = 50000000
+
+
+# Function to get the audio bitrate used inside compressed videos
+def get_video_audio_bitrate(high_quality_audio):
+    return 256000 if high_quality_audio else 64000
+
+
+# ffmpeg muxer names for output extensions that differ from them
+CONTAINER_MUXERS = {'mkv': 'matroska'}
+
+
+# Function to list the encoders compiled into the local ffmpeg build
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_encoders():
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, universal_newlines=True)
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # Encoder lines look like " V....D libx264   libx264 H.264 / AVC ..."
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+            encoders.add(parts[1])
+    return encoders
+
+
+# Function to pick Opus for Matroska output when the ffmpeg build has it, AAC otherwise
+def get_matroska_audio_codec(output_format):
+    if output_format.lower() == 'mkv' and 'libopus' in get_ffmpeg_encoders():
+        return 'libopus'
+    return 'aac'
+
+
+# Base Video Codec Engine (H.264 via libx264)
+class VideoCodecEngine:
+    name = 'h264'
+    label = 'H.264'
+    encoder = 'libx264'
+    containers = ('mp4', 'mkv', 'mov', 'avi')
+
+    def is_available(self):
+        return self.encoder in get_ffmpeg_encoders()
+
+    def supports_container(self, output_format):
+        return output_format.lower() in self.containers
+
+    def audio_codec(self, output_format):
+        return 'aac'
+
+    def preset_args(self, preset):
+        return ['-preset', preset]
+
+    def rate_control_args(self, video_bitrate):
+        return ['-b:v', str(int(video_bitrate))]
+
+    def thread_args(self, threads):
+        return ['-threads', str(threads)] if threads else []
+
+    def container_args(self, output_format):
+        return []
+
+    def build_args(self, video_bitrate, preset='medium', threads=None, output_format='mp4'):
+        return (
+            ['-c:v', self.encoder]
+            + self.preset_args(preset)
+            + self.rate_control_args(video_bitrate)
+            + self.thread_args(threads)
+            + self.container_args(output_format)
+        )
+
+
+# HEVC Engine (libx265)
+class HEVCEngine(VideoCodecEngine):
+    name = 'hevc'
+    label = 'HEVC'
+    encoder = 'libx265'
+    containers = ('mp4', 'mkv', 'mov')
+
+    def build_args(self, video_bitrate, preset='medium', threads=None, output_format='mp4'):
+        # x265 takes rate control and threading through a single -x265-params option
+        x265_params = [f'vbv-maxrate={int(video_bitrate * 1.5 / 1000)}', f'vbv-bufsize={int(video_bitrate * 3 / 1000)}']
+        if threads:
+            x265_params.append(f'pools={threads}')
+        return (
+            ['-c:v', self.encoder]
+            + self.preset_args(preset)
+            + ['-b:v', str(int(video_bitrate)), '-x265-params', ':'.join(x265_params)]
+            + self.container_args(output_format)
+        )
+
+    def container_args(self, output_format):
+        # Apple players only recognise HEVC in MP4/MOV with the hvc1 tag
+        return ['-tag:v', 'hvc1'] if output_format.lower() in ('mp4', 'mov') else []
+
+
+# VP9 Engine (libvpx-vp9)
+class VP9Engine(VideoCodecEngine):
+    name = 'vp9'
+    label = 'VP9'
+    encoder = 'libvpx-vp9'
+    containers = ('mp4', 'mkv')
+    # x264 preset name -> libvpx -cpu-used (0 is slowest)
+    cpu_used = {'ultrafast': 5, 'superfast': 5, 'veryfast': 4, 'faster': 4, 'fast': 3,
+                'medium': 2, 'slow': 1, 'slower': 1, 'veryslow': 0}
+
+    def audio_codec(self, output_format):
+        return get_matroska_audio_codec(output_format)
+
+    def preset_args(self, preset):
+        return ['-deadline', 'good', '-cpu-used', str(self.cpu_used.get(preset, 2))]
+
+    def rate_control_args(self, video_bitrate):
+        # Constrained VBR around the target, as recommended for VP9 on-demand encoding
+        return [
+            '-b:v', str(int(video_bitrate)),
+            '-minrate', str(int(video_bitrate * 0.5)),
+            '-maxrate', str(int(video_bitrate * 1.45))
+        ]
+
+    def thread_args(self, threads):
+        # libvpx is single-threaded unless row multithreading and a thread count are requested
+        return ['-row-mt', '1', '-tile-columns', '2', '-threads', str(threads or os.cpu_count() or 1)]
+
+
+# AV1 Engine (SVT-AV1)
+class AV1Engine(VideoCodecEngine):
+    name = 'av1'
+    label = 'AV1'
+    encoder = 'libsvtav1'
+    containers = ('mp4', 'mkv')
+    # x264 preset name -> SVT-AV1 preset (0 is slowest, 13 fastest)
+    svt_presets = {'ultrafast': 12, 'superfast': 11, 'veryfast': 10, 'faster': 9, 'fast': 8,
+                   'medium': 7, 'slow': 6, 'slower': 5, 'veryslow': 4}
+
+    def audio_codec(self, output_format):
+        return get_matroska_audio_codec(output_format)
+
+    def preset_args(self, preset):
+        return ['-preset', str(self.svt_presets.get(preset, 7))]
+
+    def rate_control_args(self, video_bitrate):
+        # Setting a bitrate switches SVT-AV1 to VBR rate control
+        return ['-b:v', str(int(video_bitrate))]
+
+    def thread_args(self, threads):
+        return ['-svtav1-params', f'lp={threads}'] if threads else []
+
+
+VIDEO_CODEC_ENGINES = {engine.name: engine for engine in (VideoCodecEngine(), HEVCEngine(), VP9Engine(), AV1Engine())}
+
+
+# Function to list the codec engines the local ffmpeg can encode with
+def available_video_engines():
+    return [engine for engine in VIDEO_CODEC_ENGINES.values() if engine.is_available()]
+
+
+# Function to look up a codec engine and check it against the ffmpeg build and the container
+def get_video_engine(codec, output_format):
+    engine = VIDEO_CODEC_ENGINES.get(codec)
+    if engine is None:
+        raise ValueError(f"Unknown video codec: {codec}")
+    if not engine.is_available():
+        raise ValueError(f"Encoder {engine.encoder} for {engine.label} is not available in this FFmpeg build")
+    if not engine.supports_container(output_format):
+        raise ValueError(f"{engine.label} cannot be stored in a .{output_format} file (supported: {', '.join(engine.containers)})")
+    return engine
+
+
 # Video Compression Function
-def compress_video(input_path, output_path, target_percentage=50, output_format='mp4', high_quality_audio=True, progress_callback=None, error_log_callback=None):
+def compress_video(input_path, output_path, target_percentage=50, output_format='mp4', high_quality_audio=True, preset='medium', codec='h264', threads=None, video_bitrate=None, progress_callback=None, error_log_callback=None):
+    try:
+        engine = get_video_engine(codec, output_format)
+    except ValueError as e:
+        if error_log_callback:
+            error_log_callback(str(e))
+        raise
+
     try:
         probe = ffmpeg.probe(input_path)
     except ffmpeg.Error as e:
@@ -80,29 +555,27 @@ def compress_video(input_path, output_path, target_percentage=50, output_format=
             error_log_callback(error_message)
         raise ValueError(error_message)
 
-    original_size = os.path.getsize(input_path)
-    target_size = original_size * (target_percentage / 100)
+    audio_bitrate = get_video_audio_bitrate(high_quality_audio)
+
+    if video_bitrate is None:
+        original_size = os.path.getsize(input_path)
+        target_size = original_size * (target_percentage / 100)
+        total_bitrate = (target_size * 8) / duration
 
-    audio_bitrate = 256000 if high_quality_audio else 64000
-    total_bitrate = (target_size * 8) / duration
+        min_total_bitrate = audio_bitrate + MIN_VIDEO_BITRATE
+        total_bitrate = max(total_bitrate, min_total_bitrate)
 
-    min_video_bitrate = 100000
-    min_total_bitrate = audio_bitrate + min_video_bitrate
-    total_bitrate = max(total_bitrate, min_total_bitrate)
+        video_bitrate = total_bitrate - audio_bitrate
 
-    video_bitrate = total_bitrate - audio_bitrate
-    max_video_bitrate = 50000000
-    video_bitrate = min(video_bitrate, max_video_bitrate)
+    video_bitrate = max(MIN_VIDEO_BITRATE, min(video_bitrate, MAX_VIDEO_BITRATE))
     subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     command = [
         'ffmpeg',
         '-i', input_path,
-        '-b:v', str(int(video_bitrate)),
+        *engine.build_args(video_bitrate, preset=preset, threads=threads, output_format=output_format),
         '-b:a', str(int(audio_bitrate)),
-        '-c:a', 'aac',
-        '-c:v', 'libx264',
-        '-preset', 'medium',
-        '-f', output_format,
+        '-c:a', engine.audio_codec(output_format),
+        '-f', CONTAINER_MUXERS.get(output_format.lower(), output_format),
         '-y',
         '-progress', 'pipe:1',
         output_path
@@ -141,6 +614,286 @@ def compress_video(input_path, output_path, target_percentage=50, output_format=
         raise e
 
 
+# x264 presets from fastest to slowest (slower presets compress better at the same bitrate);
+# the other codec engines map these names onto their own speed settings
+X264_PRESETS = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow']
+
+# Synthetic clip used to measure encoding speed on this machine
+CALIBRATION_SIZE = (640, 360)
+CALIBRATION_FRAMES = 48
+
+
+# Function to measure encoder throughput (pixels per second) for each preset, cached per machine and ffmpeg build
+def calibrate_presets(codec='h264', presets=None, force=False, error_log_callback=None):
+    engine = VIDEO_CODEC_ENGINES[codec]
+    presets = presets or X264_PRESETS
+    version = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True).stdout.splitlines()[0]
+    cache_key = f"{version} | {os.cpu_count()} cpus | {engine.encoder}"
+    cache_path = os.path.join(get_config_dir(), 'preset_calibration.json')
+
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+    throughput = cache.get(cache_key, {})
+    missing = [preset for preset in presets if force or preset not in throughput]
+    if not missing:
+        return {preset: throughput[preset] for preset in presets}
+
+    width, height = CALIBRATION_SIZE
+    for preset in missing:
+        command = [
+            'ffmpeg',
+            '-hide_banner',
+            '-f', 'lavfi',
+            '-i', f'testsrc2=size={width}x{height}:rate=30',
+            '-frames:v', str(CALIBRATION_FRAMES),
+            *engine.build_args(1000000, preset=preset),
+            '-f', 'null',
+            '-'
+        ]
+        start = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            error_message = f"Preset calibration failed for '{preset}' with return code {result.returncode}"
+            if error_log_callback:
+                error_log_callback(error_message)
+            raise RuntimeError(error_message)
+        throughput[preset] = CALIBRATION_FRAMES * width * height / elapsed
+
+    cache[cache_key] = throughput
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+    return {preset: throughput[preset] for preset in presets}
+
+
+# Function to estimate the encoding workload of a video as its total number of pixels
+def probe_video_workload(input_path):
+    probe = ffmpeg.probe(input_path)
+    stream = next((s for s in probe['streams'] if s.get('codec_type') == 'video'), None)
+    if stream is None:
+        return 0
+
+    duration = float(stream.get('duration') or probe['format']['duration'])
+    numerator, denominator = stream.get('avg_frame_rate', '0/0').split('/')
+    fps = float(numerator) / float(denominator) if float(denominator) else 30.0
+
+    return int(stream['width']) * int(stream['height']) * fps * duration
+
+
+# Deadline-Aware Encoder Preset Scheduler
+class PresetScheduler:
+    def __init__(self, throughput, total_pixels, deadline_seconds, started=None, safety_margin=0.9):
+        self.throughput = throughput
+        self.remaining_pixels = total_pixels
+        # The deadline counts from when the batch started, not from when videos are reached
+        self.deadline = (started if started is not None else time.monotonic()) + deadline_seconds
+        self.safety_margin = safety_margin
+        # Observed speed relative to the calibration clip, refined as files finish
+        self.speed_factor = 1.0
+
+    def select_preset(self):
+        """
+        Pick the slowest preset whose predicted time for the remaining work
+        still fits before the deadline, or the fastest one if none does.
+        """
+        remaining_time = (self.deadline - time.monotonic()) * self.safety_margin
+        presets = [preset for preset in X264_PRESETS if preset in self.throughput]
+        for preset in reversed(presets):
+            predicted = self.remaining_pixels / (self.throughput[preset] * self.speed_factor)
+            if predicted <= remaining_time:
+                return preset
+        return presets[0]
+
+    def record(self, preset, pixels, elapsed):
+        self.remaining_pixels = max(0, self.remaining_pixels - pixels)
+        if pixels and elapsed > 0:
+            observed = (pixels / elapsed) / self.throughput[preset]
+            self.speed_factor = 0.5 * self.speed_factor + 0.5 * observed
+
+
+# Complexity analysis samples a few short low-res segments instead of the whole video
+ANALYSIS_SEGMENTS = 6
+ANALYSIS_SEGMENT_SECONDS = 4
+
+
+# Function to measure how hard a video is to compress, as bytes per second of a fast constant-quality encode
+def analyze_video_complexity(input_path, duration):
+    if duration <= ANALYSIS_SEGMENTS * ANALYSIS_SEGMENT_SECONDS:
+        segments = [(0, duration)]
+    else:
+        segments = [
+            (duration * (index + 0.5) / ANALYSIS_SEGMENTS - ANALYSIS_SEGMENT_SECONDS / 2, ANALYSIS_SEGMENT_SECONDS)
+            for index in range(ANALYSIS_SEGMENTS)
+        ]
+
+    total_bytes = 0
+    for start, length in segments:
+        command = [
+            'ffmpeg',
+            '-hide_banner',
+            '-nostdin',
+            '-ss', f'{start:.3f}',
+            '-t', f'{length:.3f}',
+            '-i', input_path,
+            '-an',
+            '-vf', 'scale=-2:144',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-crf', '28',
+            '-f', 'mpegts',
+            'pipe:1'
+        ]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        while True:
+            chunk = process.stdout.read(64 * 1024)
+            if not chunk:
+                break
+            total_bytes += len(chunk)
+        process.wait()
+        if process.returncode != 0:
+            raise RuntimeError(f"Complexity analysis failed with return code {process.returncode} for file: {os.path.basename(input_path)}")
+
+    return total_bytes / sum(length for _, length in segments)
+
+
+# Function to split a total output size across videos in proportion to their complexity
+def allocate_batch_bitrates(videos, total_target_bytes, audio_bitrate):
+    """
+    videos is a list of (input_path, duration, complexity). Returns
+    {input_path: video_bitrate}, where every bitrate respects the
+    MIN/MAX_VIDEO_BITRATE clamps and the bits freed or consumed by
+    clamping are redistributed over the remaining videos.
+    """
+    budget = total_target_bytes * 8 - sum(audio_bitrate * duration for _, duration, _ in videos)
+    remaining = [(path, duration, max(complexity, 1.0)) for path, duration, complexity in videos if duration > 0]
+    bitrates = {}
+
+    while remaining:
+        weight = sum(complexity * duration for _, duration, complexity in remaining)
+        proposed = {path: max(budget, 0) * complexity / weight for path, _, complexity in remaining}
+
+        over = [video for video in remaining if proposed[video[0]] > MAX_VIDEO_BITRATE]
+        under = [video for video in remaining if proposed[video[0]] < MIN_VIDEO_BITRATE]
+        if not over and not under:
+            bitrates.update(proposed)
+            break
+
+        # Clamp only the side with the larger violation per pass; the bits it frees or
+        # consumes may bring videos on the other side back into range
+        excess = sum((proposed[path] - MAX_VIDEO_BITRATE) * duration for path, duration, _ in over)
+        deficit = sum((MIN_VIDEO_BITRATE - proposed[path]) * duration for path, duration, _ in under)
+        clamped = over if excess >= deficit else under
+
+        for path, duration, complexity in clamped:
+            bitrates[path] = max(MIN_VIDEO_BITRATE, min(proposed[path], MAX_VIDEO_BITRATE))
+            budget -= bitrates[path] * duration
+        remaining = [video for video in remaining if video not in clamped]
+
+    return bitrates
+
+
+# Contact sheet layout for video previews
+CONTACT_SHEET_COLUMNS = 4
+CONTACT_SHEET_ROWS = 3
+CONTACT_SHEET_TILE_WIDTH = 320
+
+
+# Function to decode the nearest keyframe at a timestamp as a scaled-down image
+def extract_keyframe(input_path, timestamp, width=CONTACT_SHEET_TILE_WIDTH):
+    command = [
+        'ffmpeg',
+        '-hide_banner',
+        '-nostdin',
+        # Input-side seek to the keyframe at or before the timestamp, decoding keyframes only;
+        # accurate seek would skip ahead to the next keyframe, which may not exist near the end
+        '-skip_frame', 'nokey',
+        '-noaccurate_seek',
+        '-ss', f'{timestamp:.3f}',
+        '-i', input_path,
+        '-frames:v', '1',
+        '-vf', f'scale={width}:-2',
+        '-an',
+        '-f', 'image2pipe',
+        '-c:v', 'bmp',
+        'pipe:1'
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if result.returncode != 0 or not result.stdout:
+        return None
+
+    frame = Image.open(io.BytesIO(result.stdout))
+    frame.load()
+    return frame
+
+
+# Contact Sheet Generation Function
+def generate_contact_sheet(input_path, output_path, target_percentage=50, output_format='jpg',
+                           columns=CONTACT_SHEET_COLUMNS, rows=CONTACT_SHEET_ROWS, tile_width=CONTACT_SHEET_TILE_WIDTH,
+                           progress_callback=None, error_log_callback=None):
+    try:
+        probe = ffmpeg.probe(input_path)
+    except ffmpeg.Error as e:
+        error_message = f"FFmpeg probe error for {os.path.basename(input_path)}: {e.stderr.decode()}"
+        if error_log_callback:
+            error_log_callback(error_message)
+        raise ValueError(error_message)
+
+    duration_str = probe['format'].get('duration', None)
+    if duration_str is None or duration_str == 'N/A':
+        error_message = f"Cannot determine duration of video file: {input_path}"
+        if error_log_callback:
+            error_log_callback(error_message)
+        raise ValueError(error_message)
+
+    try:
+        duration = float(duration_str)
+    except ValueError:
+        error_message = f"Invalid duration value '{duration_str}' for file: {input_path}"
+        if error_log_callback:
+            error_log_callback(error_message)
+        raise ValueError(error_message)
+
+    try:
+        count = columns * rows
+        timestamps = [duration * (index + 0.5) / count for index in range(count)]
+
+        # Each seek is its own short ffmpeg process, so they run side by side
+        with ThreadPoolExecutor(max_workers=min(count, os.cpu_count() or 1)) as executor:
+            frames = list(executor.map(lambda t: extract_keyframe(input_path, t, tile_width), timestamps))
+
+        decoded = [frame for frame in frames if frame]
+        if not decoded:
+            raise RuntimeError(f"No keyframes could be decoded from {os.path.basename(input_path)}")
+
+        # Missing frames leave their tile black so the others stay in time order
+        tile_height = max(frame.height for frame in decoded)
+        sheet = Image.new('RGB', (columns * tile_width, rows * tile_height), 'black')
+        for index, frame in enumerate(frames):
+            if frame is None:
+                continue
+            x = (index % columns) * tile_width
+            y = (index // columns) * tile_height
+            sheet.paste(frame.convert('RGB'), (x, y))
+
+        save_image(sheet, output_path, target_percentage, output_format)
+
+        if progress_callback:
+            progress_callback(1.0)
+
+    except Exception as e:
+        if error_log_callback:
+            error_log_callback(f"Contact Sheet Error for {os.path.basename(input_path)}: {str(e)}")
+        raise e
+
+
 # Audio Extraction Function
 def extract_audio(input_path, output_path, bitrate=320, progress_callback=None, error_log_callback=None):
     try:
@@ -204,6 +957,120 @@ def extract_audio(input_path, output_path, bitrate=320, progress_callback=None,
         raise e
 
 
+# Small audio files are transcoded many per ffmpeg process; the batch size also keeps command lines short
+AUDIO_BATCH_SIZE = 64
+AUDIO_BATCH_MAX_FILE_SIZE = 16 * 1024 * 1024
+
+
+# Function to pick the audio encoder for an output format
+def get_audio_codec(output_format):
+    return 'libmp3lame' if output_format.lower() == 'mp3' else 'aac'
+
+
+# Function to check once per output format that ffmpeg can encode and write it; returns an error message or None
+@functools.lru_cache(maxsize=None)
+def check_audio_output(output_format):
+    audio_codec = get_audio_codec(output_format)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        command = [
+            'ffmpeg', '-hide_banner', '-nostdin', '-y',
+            '-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=stereo', '-t', '0.1',
+            '-c:a', audio_codec,
+            '-f', output_format,
+            os.path.join(temp_dir, f'check.{output_format}')
+        ]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode == 0:
+        return None
+    details = result.stderr.strip().splitlines()[-1:] or ['']
+    return f"FFmpeg cannot write {audio_codec} audio as .{output_format} ({details[0]})"
+
+
+# Function to find which file of a batch ffmpeg gave up on from its error output; None if no single file is named
+def _find_failed_audio_job(jobs, stderr):
+    for line in reversed(stderr.splitlines()):
+        # "Stream map '3:a:0' matches no streams." and "[in#3 @ 0x...] Error opening input: ..."
+        match = re.search(r"Stream map '(\d+):", line)
+        if not match and 'rror' in line:
+            match = re.search(r'\[(?:in|out)#(\d+)', line)
+        if match and int(match.group(1)) < len(jobs):
+            return int(match.group(1))
+        # "a.wav: Invalid data found ..." and "Error opening input file a.wav."
+        for index, (input_path, output_path) in enumerate(jobs):
+            for path in (input_path, output_path):
+                if line.startswith(f'{path}: ') or line.endswith(f' file {path}.'):
+                    return index
+    return None
+
+
+# Function to report a file that failed in (or as) an ffmpeg batch
+def _report_audio_failure(input_path, result, completion_callback, error_log_callback):
+    details = result.stderr.strip().splitlines()[-1:] or ['']
+    error_message = f"FFmpeg failed with return code {result.returncode} for file: {os.path.basename(input_path)} ({details[0]})"
+    if error_log_callback:
+        error_log_callback(f"Audio Compression Error for {os.path.basename(input_path)}: {error_message}")
+    if completion_callback:
+        completion_callback(input_path, RuntimeError(error_message))
+
+
+# Function to transcode one group of audio files with a single ffmpeg process
+def _run_audio_batch(jobs, bitrate, completion_callback, error_log_callback):
+    while jobs:
+        command = ['ffmpeg', '-hide_banner', '-nostdin', '-y']
+        for input_path, _ in jobs:
+            command += ['-i', input_path]
+        for index, (_, output_path) in enumerate(jobs):
+            output_format = os.path.splitext(output_path)[1][1:]
+            command += [
+                '-map', f'{index}:a:0',
+                '-b:a', f'{bitrate}k',
+                '-c:a', get_audio_codec(output_format),
+                '-f', output_format,
+                output_path
+            ]
+
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+
+        if result.returncode == 0:
+            for input_path, _ in jobs:
+                if completion_callback:
+                    completion_callback(input_path, None)
+            return
+
+        # ffmpeg stops at the first file it can't open, naming it; that file fails and the rest retry together
+        failed = 0 if len(jobs) == 1 else _find_failed_audio_job(jobs, result.stderr)
+        if failed is None:
+            break
+        _report_audio_failure(jobs[failed][0], result, completion_callback, error_log_callback)
+        jobs = jobs[:failed] + jobs[failed + 1:]
+
+    # An error that names no file (full disk, crashed encoder) would fail every retry, so each file runs alone
+    for job in jobs:
+        _run_audio_batch([job], bitrate, completion_callback, error_log_callback)
+
+
+# Batched Audio Compression Function
+def compress_audio_batch(jobs, bitrate=128, batch_size=AUDIO_BATCH_SIZE, should_stop=None,
+                         completion_callback=None, error_log_callback=None):
+    # An output format ffmpeg can't write would fail every file, so it is checked before any batch runs
+    runnable_jobs = []
+    for input_path, output_path in jobs:
+        error_message = check_audio_output(os.path.splitext(output_path)[1][1:])
+        if error_message is None:
+            runnable_jobs.append((input_path, output_path))
+            continue
+        if error_log_callback:
+            error_log_callback(f"Audio Compression Error for {os.path.basename(input_path)}: {error_message}")
+        if completion_callback:
+            completion_callback(input_path, RuntimeError(error_message))
+    jobs = runnable_jobs
+
+    for start in range(0, len(jobs), batch_size):
+        if should_stop and should_stop():
+            return
+        _run_audio_batch(jobs[start:start + batch_size], bitrate, completion_callback, error_log_callback)
+
+
 # Audio Compression Function
 def compress_audio(input_path, output_path, bitrate=128, output_format='mp3', progress_callback=None, error_log_callback=None):
     try:
@@ -229,7 +1096,7 @@ def compress_audio(input_path, output_path, bitrate=128, output_format='mp3', pr
             error_log_callback(error_message)
         raise ValueError(error_message)
 
-    audio_codec = 'libmp3lame' if output_format.lower() == 'mp3' else 'aac'
+    audio_codec = get_audio_codec(output_format)
 
     command = [
         'ffmpeg',
@@ -285,6 +1152,127 @@ def open_folder(folder_path):
         subprocess.Popen(['xdg-open', folder_path])
 
 
+# Default options for jobs that don't come from the GUI (daemon and watch modes)
+DEFAULT_OPTIONS = {
+    'image_size_percentage': 50,
+    'video_size_percentage': 50,
+    'audio_bitrate': '256',
+    'output_folder': None,
+    'high_quality_audio': True,
+    'video_codec': 'h264',
+    'generate_previews': False,
+    'png_quantize': False,
+    'image_format': 'jpg',
+    'video_format': 'mp4',
+    'audio_format': 'mp3',
+    'memory_budget_mb': None
+}
+
+
+# Function to build the output path for an input file ({name}_compressed{ext})
+def build_output_path(file_path, output_folder, image_format, video_format, audio_format):
+    if file_path.lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
+        default_extension = '.' + image_format
+    elif file_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv', 'mp3')):
+        default_extension = '.' + video_format
+    elif file_path.lower().endswith(('mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a')):
+        default_extension = '.' + audio_format
+    else:
+        return None
+
+    base_name = os.path.basename(file_path)
+    name, _ = os.path.splitext(base_name)
+    suggested_name = f"{name}_compressed{default_extension}"
+
+    return os.path.join(output_folder, suggested_name)
+
+
+# Function to check that a path resolves (following symlinks) to a location inside a folder
+def is_path_within(path, folder):
+    path = os.path.realpath(path)
+    folder = os.path.realpath(folder)
+    return os.path.commonpath([path, folder]) == folder
+
+
+# Extensions of every file type the app can compress or convert
+SUPPORTED_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.webp',
+    '.mp4', '.mov', '.avi', '.mkv',
+    '.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'
+)
+
+
+# Function to check whether a file has a supported extension
+def is_supported_file(file_path):
+    return file_path.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+# Function to compress or convert a single file according to the options; returns False for unsupported files
+def process_media_file(input_path, output_path, options, progress_callback=None, error_log_callback=None):
+    output_format = os.path.splitext(output_path)[1][1:]
+
+    if input_path.lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
+        compress_image(
+            input_path,
+            output_path,
+            target_percentage=options['image_size_percentage'],
+            output_format=output_format,
+            png_quantize=options.get('png_quantize', False),
+            progress_callback=progress_callback,
+            error_log_callback=error_log_callback
+        )
+    elif input_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv', 'mp3')):
+        if output_format.lower() == 'mp3':
+            extract_audio(
+                input_path,
+                output_path,
+                bitrate=int(options['audio_bitrate']),
+                progress_callback=progress_callback,
+                error_log_callback=error_log_callback
+            )
+        else:
+            compress_video(
+                input_path,
+                output_path,
+                target_percentage=options['video_size_percentage'],
+                output_format=output_format,
+                high_quality_audio=options['high_quality_audio'],
+                preset=options.get('video_preset', 'medium'),
+                codec=options.get('video_codec', 'h264'),
+                video_bitrate=options.get('video_bitrate'),
+                progress_callback=progress_callback,
+                error_log_callback=error_log_callback
+            )
+            if options.get('generate_previews'):
+                image_format = options.get('image_format', 'jpg')
+                name = os.path.splitext(os.path.basename(input_path))[0]
+                preview_path = os.path.join(os.path.dirname(output_path), f"{name}_preview.{image_format}")
+                try:
+                    generate_contact_sheet(
+                        input_path,
+                        preview_path,
+                        target_percentage=options['image_size_percentage'],
+                        output_format=image_format,
+                        error_log_callback=error_log_callback
+                    )
+                except Exception:
+                    # A missing preview shouldn't fail a video that compressed fine; the error is already logged
+                    pass
+    elif input_path.lower().endswith(('mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a')):
+        compress_audio(
+            input_path,
+            output_path,
+            bitrate=int(options['audio_bitrate']),
+            output_format=output_format,
+            progress_callback=progress_callback,
+            error_log_callback=error_log_callback
+        )
+    else:
+        return False
+
+    return True
+
+
 # Worker Thread for Compression
 class CompressionWorker(QThread):
     progress_signal = Signal(float)
@@ -297,8 +1285,10 @@ class CompressionWorker(QThread):
         self.files_to_process = files_to_process
         self.options = options
         self._is_interrupted = False
+        self._started = None
 
     def run(self):
+        self._started = time.monotonic()
         try:
             success = True
             total_files = len(self.files_to_process)
@@ -306,7 +1296,62 @@ class CompressionWorker(QThread):
 
             self.status_signal.emit("Starting compression...")
 
-            for input_path, output_path in self.files_to_process:
+            # Images run in parallel under a RAM budget, small audio files are batched,
+            # everything else runs sequentially
+            image_jobs = [job for job in self.files_to_process if job[0].lower().endswith(('png', 'jpg', 'jpeg', 'webp'))]
+            audio_jobs = [job for job in self.files_to_process if self.is_batchable_audio(*job)]
+            grouped_jobs = set(image_jobs) | set(audio_jobs)
+            other_jobs = [job for job in self.files_to_process if job not in grouped_jobs]
+            if len(audio_jobs) < 2:
+                other_jobs += audio_jobs
+                audio_jobs = []
+
+            def job_completed(input_path, error):
+                nonlocal processed_files, success
+                if error is None:
+                    processed_files += 1
+                    self.progress_signal.emit(processed_files / total_files)
+                    self.status_signal.emit(f"Compressed {processed_files}/{total_files} files.")
+                    self.error_signal.emit(f"Successfully compressed: {os.path.basename(input_path)}")
+                else:
+                    self.status_signal.emit(f"Error processing {os.path.basename(input_path)}.")
+                    self.error_signal.emit(f"Error processing {os.path.basename(input_path)}: {str(error)}")
+                    success = False
+
+            if image_jobs:
+                compress_images_parallel(
+                    image_jobs,
+                    target_percentage=self.options['image_size_percentage'],
+                    png_quantize=self.options.get('png_quantize', False),
+                    memory_budget=get_memory_budget(self.options),
+                    should_stop=lambda: self._is_interrupted,
+                    completion_callback=job_completed,
+                    error_log_callback=self.error_signal.emit
+                )
+
+                if self._is_interrupted:
+                    self.status_signal.emit("Compression interrupted.")
+                    self.completed_signal.emit(False)
+                    return
+
+            if audio_jobs:
+                compress_audio_batch(
+                    audio_jobs,
+                    bitrate=int(self.options['audio_bitrate']),
+                    should_stop=lambda: self._is_interrupted,
+                    completion_callback=job_completed,
+                    error_log_callback=self.error_signal.emit
+                )
+
+                if self._is_interrupted:
+                    self.status_signal.emit("Compression interrupted.")
+                    self.completed_signal.emit(False)
+                    return
+
+            preset_scheduler, video_workloads = self.plan_video_presets(other_jobs)
+            video_bitrates = self.plan_video_bitrates(other_jobs)
+
+            for input_path, output_path in other_jobs:
                 if self._is_interrupted:
                     self.status_signal.emit("Compression interrupted.")
                     self.completed_signal.emit(False)
@@ -317,47 +1362,33 @@ class CompressionWorker(QThread):
                         overall_progress = ((processed_files + progress) / total_files)
                         self.progress_signal.emit(overall_progress)
 
-                    if input_path.lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
-                        output_format = os.path.splitext(output_path)[1][1:]
-                        compress_image(
-                            input_path,
-                            output_path,
-                            target_percentage=self.options['image_size_percentage'],
-                            output_format=output_format,
-                            progress_callback=file_progress_callback,
-                            error_log_callback=self.error_signal.emit
-                        )
-                    elif input_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv', 'mp3')):
-                        output_format = os.path.splitext(output_path)[1][1:]
-                        if output_format.lower() == 'mp3':
-                            extract_audio(
-                                input_path,
-                                output_path,
-                                bitrate=int(self.options['audio_bitrate']),
-                                progress_callback=file_progress_callback,
-                                error_log_callback=self.error_signal.emit
-                            )
-                        else:
-                            compress_video(
-                                input_path,
-                                output_path,
-                                target_percentage=self.options['video_size_percentage'],
-                                output_format=output_format,
-                                high_quality_audio=self.options['high_quality_audio'],
-                                progress_callback=file_progress_callback,
-                                error_log_callback=self.error_signal.emit
-                            )
-                    elif input_path.lower().endswith(('mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a')):
-                        output_format = os.path.splitext(output_path)[1][1:]
-                        compress_audio(
+                    file_options = dict(self.options)
+                    if input_path in video_bitrates:
+                        file_options['video_bitrate'] = video_bitrates[input_path]
+                    workload = video_workloads.get(input_path)
+                    if workload:
+                        preset = preset_scheduler.select_preset()
+                        file_options['video_preset'] = preset
+                        self.status_signal.emit(f"Encoding {os.path.basename(input_path)} with preset '{preset}'...")
+
+                    started = time.monotonic()
+                    encoded = False
+                    try:
+                        handled = process_media_file(
                             input_path,
                             output_path,
-                            bitrate=int(self.options['audio_bitrate']),
-                            output_format=output_format,
+                            file_options,
                             progress_callback=file_progress_callback,
                             error_log_callback=self.error_signal.emit
                         )
-                    else:
+                        encoded = True
+                    finally:
+                        # Failed files still leave the remaining workload but say nothing about speed
+                        if workload:
+                            elapsed = time.monotonic() - started if encoded else 0
+                            preset_scheduler.record(file_options['video_preset'], workload, elapsed)
+
+                    if not handled:
                         self.status_signal.emit(f"Unsupported file type: {input_path}")
                         self.error_signal.emit(f"Unsupported file type: {input_path}")
                         continue
@@ -392,10 +1423,696 @@ class CompressionWorker(QThread):
             self.error_signal.emit(f"An unexpected error occurred: {str(e)}")
             self.completed_signal.emit(False)
 
+    def is_batchable_audio(self, input_path, output_path):
+        # Only files process_media_file would send to compress_audio, and only small ones
+        if input_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv', 'mp3')):
+            return False
+        if not input_path.lower().endswith(('wav', 'flac', 'aac', 'ogg', 'm4a')):
+            return False
+        try:
+            return os.path.getsize(input_path) <= AUDIO_BATCH_MAX_FILE_SIZE
+        except OSError:
+            return False
+
+    def plan_video_bitrates(self, jobs):
+        """
+        When the video size applies to the whole batch, analyse every video's
+        complexity and split the pooled size between them. Returns
+        {input_path: video_bitrate}, empty when each file uses its own percentage.
+        """
+        if not self.options.get('video_pool_budget'):
+            return {}
+
+        video_jobs = [
+            input_path for input_path, output_path in jobs
+            if input_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv')) and not output_path.lower().endswith('mp3')
+        ]
+
+        videos = []
+        for index, input_path in enumerate(video_jobs):
+            if self._is_interrupted:
+                return {}
+            self.status_signal.emit(f"Analysing video complexity {index + 1}/{len(video_jobs)}...")
+            try:
+                duration = float(ffmpeg.probe(input_path)['format']['duration'])
+                complexity = analyze_video_complexity(input_path, duration)
+            except Exception as e:
+                # The file falls back to its own percentage; compress_video reports real probe errors
+                self.error_signal.emit(f"Complexity analysis skipped for {os.path.basename(input_path)}: {str(e)}")
+                continue
+            videos.append((input_path, duration, complexity))
+
+        if not videos:
+            return {}
+
+        target_mb = self.options.get('video_batch_target_mb')
+        if target_mb:
+            total_target_bytes = target_mb * 1024 * 1024
+        else:
+            original_size = sum(os.path.getsize(input_path) for input_path, _, _ in videos)
+            total_target_bytes = original_size * (self.options['video_size_percentage'] / 100)
+
+        audio_bitrate = get_video_audio_bitrate(self.options['high_quality_audio'])
+        return allocate_batch_bitrates(videos, total_target_bytes, audio_bitrate)
+
+    def plan_video_presets(self, jobs):
+        """
+        Calibrate the selected encoder's presets and size up the batch's video
+        workload when a deadline is set. Returns (None, {}) when presets stay at the default.
+        """
+        deadline_minutes = self.options.get('video_deadline_minutes')
+        video_jobs = [
+            input_path for input_path, output_path in jobs
+            if input_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv')) and not output_path.lower().endswith('mp3')
+        ]
+        if not deadline_minutes or not video_jobs:
+            return None, {}
+
+        try:
+            self.status_signal.emit("Calibrating encoder speed...")
+            throughput = calibrate_presets(self.options.get('video_codec', 'h264'), error_log_callback=self.error_signal.emit)
+        except Exception as e:
+            self.error_signal.emit(f"Preset calibration failed, using the default preset: {str(e)}")
+            return None, {}
+
+        video_workloads = {}
+        for input_path in video_jobs:
+            try:
+                video_workloads[input_path] = probe_video_workload(input_path)
+            except Exception:
+                # compress_video reports probe errors for this file itself
+                continue
+
+        scheduler = PresetScheduler(throughput, sum(video_workloads.values()), deadline_minutes * 60, started=self._started)
+        return scheduler, video_workloads
+
     def interrupt(self):
         self._is_interrupted = True
 
 
+# Event queue of the current daemon worker process, set by the pool initializer
+_daemon_events = None
+
+
+# Function to warm up a daemon worker process once, before it takes any jobs
+def _daemon_worker_init(events):
+    global _daemon_events
+    _daemon_events = events
+    check_ffmpeg_installed()
+
+
+# Finished daemon jobs are kept for inspection for a while, then dropped
+DAEMON_JOB_RETENTION_SECONDS = 3600
+DAEMON_MAX_FINISHED_JOBS = 500
+
+
+# Function to run one file of a daemon job; images run on the daemon's own threads under its shared RAM budget
+def _daemon_run_file(job_id, index, input_path, output_path, options, events=None, admission=None):
+    events = events or _daemon_events
+
+    def send(kind, value):
+        events.put({'job': job_id, 'file': index, 'event': kind, 'value': value})
+
+    send('started', input_path)
+    if admission is not None:
+        compress_image_admitted(
+            admission,
+            input_path,
+            output_path,
+            target_percentage=options['image_size_percentage'],
+            png_quantize=options['png_quantize'],
+            progress_callback=lambda progress: send('progress', progress),
+            error_log_callback=lambda message: send('log', message)
+        )
+        return
+
+    handled = process_media_file(
+        input_path,
+        output_path,
+        options,
+        progress_callback=lambda progress: send('progress', progress),
+        error_log_callback=lambda message: send('log', message)
+    )
+    if not handled:
+        raise ValueError(f"Unsupported file type: {input_path}")
+
+
+# Function to validate the files of a daemon job and resolve their output paths
+def build_job_entries(files, options, output_root=None):
+    """
+    files holds input paths (named with build_output_path) or [input, output]
+    pairs. Every output has to land inside the job's output_folder, and the
+    output_folder inside output_root when the daemon has one. Raises
+    ValueError for anything else.
+    """
+    if not isinstance(files, list) or not files:
+        raise ValueError("A job needs at least one file.")
+
+    output_folder = options['output_folder']
+    if not isinstance(output_folder, str) or not output_folder:
+        raise ValueError("An output_folder option is required.")
+    if output_root and not is_path_within(output_folder, output_root):
+        raise ValueError(f"output_folder must be inside {output_root}.")
+
+    entries = []
+    for item in files:
+        if isinstance(item, str):
+            input_path = item
+            output_path = build_output_path(
+                item,
+                output_folder,
+                options['image_format'],
+                options['video_format'],
+                options['audio_format']
+            )
+            if output_path is None:
+                raise ValueError(f"Unsupported file type: {item}")
+        elif isinstance(item, (list, tuple)) and len(item) == 2 and all(isinstance(path, str) for path in item):
+            input_path, output_path = item
+        else:
+            raise ValueError("Each file must be an input path or an [input, output] pair of paths.")
+
+        if not is_path_within(output_path, output_folder):
+            raise ValueError(f"Output path {output_path} is outside the output_folder.")
+        entries.append({'input': input_path, 'output': output_path, 'state': 'queued', 'progress': 0.0, 'error': None})
+
+    return entries
+
+
+# Long-running Compression Service with Warm Worker Processes
+class CompressionDaemon:
+    def __init__(self, workers=None, memory_budget_mb=None, output_root=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.output_root = os.path.realpath(output_root) if output_root else None
+        self._events = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_daemon_worker_init,
+            initargs=(self._events,)
+        )
+        # Images decode in this process, so one admission controller covers every image job
+        self._image_executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._admission = ImageAdmissionController(get_memory_budget({'memory_budget_mb': memory_budget_mb}))
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+        self._condition = threading.Condition()
+
+        threading.Thread(target=self._pump_events, daemon=True).start()
+
+        # Start every worker process up front so the first job doesn't pay the startup cost
+        for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, files, options=None):
+        if options is not None and not isinstance(options, dict):
+            raise ValueError("options must be an object.")
+        job_options = dict(DEFAULT_OPTIONS)
+        job_options.update(options or {})
+        entries = build_job_entries(files, job_options, self.output_root)
+
+        # The lock keeps the event pump and done callbacks away until the job is registered
+        with self._condition:
+            self._prune_finished_jobs()
+
+            job_id = str(next(self._job_ids))
+            futures = []
+            try:
+                for index, entry in enumerate(entries):
+                    if entry['input'].lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
+                        future = self._image_executor.submit(
+                            _daemon_run_file, job_id, index, entry['input'], entry['output'], job_options,
+                            events=self._events, admission=self._admission
+                        )
+                    else:
+                        future = self._executor.submit(_daemon_run_file, job_id, index, entry['input'], entry['output'], job_options)
+                    futures.append(future)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            self._jobs[job_id] = {'id': job_id, 'state': 'queued', 'files': entries, 'events': [], 'next_event': 0,
+                                  'finished_at': None, 'futures': futures}
+            for index, future in enumerate(futures):
+                future.add_done_callback(lambda f, index=index: self._file_finished(job_id, index, f))
+
+        return job_id
+
+    def cancel(self, job_id):
+        """
+        Cancel the files of a job that haven't started yet; files already
+        running in a worker process finish normally.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            futures = list(job['futures'])
+        for future in futures:
+            future.cancel()
+        return True
+
+    def has_job(self, job_id):
+        with self._condition:
+            return job_id in self._jobs
+
+    def summary(self, job_id=None):
+        with self._condition:
+            jobs = [self._jobs[job_id]] if job_id else list(self._jobs.values())
+            return [
+                {
+                    'id': job['id'],
+                    'state': job['state'],
+                    'files': [dict(entry) for entry in job['files']]
+                }
+                for job in jobs
+            ]
+
+    def events(self, job_id, since=0):
+        """
+        Yield the job's events with a sequence number of `since` or later,
+        blocking for new ones until the job reaches a final state. Only the
+        latest progress event of each file is kept, so a slow reader skips
+        stale progress rather than replaying it.
+        """
+        with self._condition:
+            job = self._jobs[job_id]
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: job['next_event'] > since or job['state'] in ('done', 'failed', 'cancelled')
+                )
+                new_events = [event for event in job['events'] if event['seq'] >= since]
+                since = job['next_event']
+                finished = job['state'] in ('done', 'failed', 'cancelled')
+            for event in new_events:
+                yield event
+            if finished and not new_events:
+                return
+
+    def shutdown(self):
+        self._image_executor.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._events.put(None)
+
+    def _add_event(self, job, event):
+        event['seq'] = job['next_event']
+        job['next_event'] += 1
+        if event['event'] == 'progress':
+            job['events'] = [
+                previous for previous in job['events']
+                if not (previous['event'] == 'progress' and previous['file'] == event['file'])
+            ]
+        job['events'].append(event)
+
+    def _prune_finished_jobs(self):
+        finished = sorted(
+            (job for job in self._jobs.values() if job['finished_at'] is not None),
+            key=lambda job: job['finished_at']
+        )
+        expired = time.monotonic() - DAEMON_JOB_RETENTION_SECONDS
+        excess = len(finished) - DAEMON_MAX_FINISHED_JOBS
+        for position, job in enumerate(finished):
+            if position < excess or job['finished_at'] < expired:
+                del self._jobs[job['id']]
+
+    def _pump_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            with self._condition:
+                job = self._jobs.get(event['job'])
+                if job is None:
+                    continue
+                entry = job['files'][event['file']]
+                # Progress can arrive after the worker already reported the file as finished
+                if event['event'] in ('started', 'progress') and entry['state'] in ('done', 'failed', 'cancelled'):
+                    continue
+                if event['event'] == 'started':
+                    entry['state'] = 'running'
+                    job['state'] = 'running'
+                elif event['event'] == 'progress':
+                    entry['progress'] = event['value']
+                self._add_event(job, event)
+                self._condition.notify_all()
+
+    def _file_finished(self, job_id, index, future):
+        with self._condition:
+            job = self._jobs[job_id]
+            entry = job['files'][index]
+            if future.cancelled():
+                entry['state'] = 'cancelled'
+            elif future.exception() is not None:
+                entry['state'] = 'failed'
+                entry['error'] = str(future.exception())
+            else:
+                entry['state'] = 'done'
+                entry['progress'] = 1.0
+            self._add_event(job, {'job': job_id, 'file': index, 'event': entry['state'], 'value': entry['error']})
+
+            states = [file_entry['state'] for file_entry in job['files']]
+            if all(state in ('done', 'failed', 'cancelled') for state in states):
+                if 'failed' in states:
+                    job['state'] = 'failed'
+                elif 'cancelled' in states:
+                    job['state'] = 'cancelled'
+                else:
+                    job['state'] = 'done'
+                job['finished_at'] = time.monotonic()
+            self._condition.notify_all()
+
+
+# HTTP Request Handler for the Compression Daemon
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST   /jobs              submit {"files": [...], "options": {...}}
+    GET    /jobs              inspect the queue
+    GET    /jobs/<id>         inspect one job
+    GET    /jobs/<id>/events  stream progress as newline-delimited JSON
+    DELETE /jobs/<id>         cancel the job's queued files
+
+    POST bodies must be sent as application/json, and requests that carry
+    an Origin header (anything a web page sends) are refused.
+    """
+    compression_daemon = None
+
+    def do_POST(self):
+        if self.reject_browser_request():
+            return
+        if self.path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': 'Not found'})
+        # Browsers can only send JSON cross-origin after a preflight, which the daemon never answers
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            return self.send_json(415, {'error': 'Content-Type must be application/json'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("The request body must be a JSON object.")
+            job_id = self.compression_daemon.submit(request.get('files', []), request.get('options'))
+        except (ValueError, TypeError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(201, {'id': job_id})
+
+    def do_GET(self):
+        if self.reject_browser_request():
+            return
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['jobs']:
+            return self.send_json(200, self.compression_daemon.summary())
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and self.compression_daemon.has_job(parts[1]):
+            if len(parts) == 2:
+                return self.send_json(200, self.compression_daemon.summary(parts[1])[0])
+            if parts[2] == 'events':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                for event in self.compression_daemon.events(parts[1]):
+                    self.wfile.write((json.dumps(event) + '\n').encode())
+                    self.wfile.flush()
+                return
+        self.send_json(404, {'error': 'Not found'})
+
+    def do_DELETE(self):
+        if self.reject_browser_request():
+            return
+        parts = [part for part in self.path.split('/') if part]
+        if len(parts) == 2 and parts[0] == 'jobs' and self.compression_daemon.cancel(parts[1]):
+            return self.send_json(200, {'id': parts[1], 'cancelled': True})
+        self.send_json(404, {'error': 'Not found'})
+
+    def reject_browser_request(self):
+        # Jobs come from local tools, never from web pages; browsers mark their requests with an Origin
+        if self.headers.get('Origin') is None:
+            return False
+        self.send_json(403, {'error': 'Cross-origin requests are not allowed'})
+        return True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to run the compression daemon on localhost until interrupted
+def serve(host='127.0.0.1', port=8765, workers=None, memory_budget_mb=None, output_root=None):
+    check_ffmpeg_installed()
+    daemon = CompressionDaemon(workers, memory_budget_mb, output_root)
+    handler = type('BoundDaemonRequestHandler', (DaemonRequestHandler,), {'compression_daemon': daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Compression daemon listening on http://{host}:{port} with {daemon.workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.shutdown()
+
+
+# inotify event masks (see linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+
+# Hot-Folder Watcher Built on inotify
+class FolderWatcher:
+    def __init__(self, watch_folder, options, workers=None, queue_size=64, debounce=2.0,
+                 status_callback=None, error_log_callback=None):
+        if not sys.platform.startswith('linux'):
+            raise EnvironmentError("Watch mode requires Linux inotify.")
+
+        self.watch_folder = os.path.abspath(watch_folder)
+        self.options = options
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 2)
+        self.debounce = debounce
+        self.status_callback = status_callback
+        self.error_log_callback = error_log_callback
+
+        # Files waiting for their writer to finish: path -> [last event time, write state, last size].
+        # 'writing' files wait for inotify's close-write ('closed'); files found by a rescan ('found')
+        # have no writer to watch, so their size has to hold still instead
+        self._pending = {}
+        # Files handed to a worker that haven't produced an up-to-date output yet: path -> (size, mtime),
+        # so repeated events for an unchanged file (or one that failed) don't resubmit it
+        self._submitted = {}
+        self._submitted_lock = threading.Lock()
+        self._work_queue = queue.Queue(maxsize=queue_size)
+        # Image jobs from every worker thread share one RAM budget
+        self._admission = ImageAdmissionController(get_memory_budget(options))
+        self._watches = {}
+        self._stop = threading.Event()
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def run(self):
+        self._add_watch_tree(self.watch_folder)
+
+        threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        # Files dropped before the watcher started are picked up like new arrivals
+        self._rescan()
+        self._report_status(f"Watching {self.watch_folder} with {self.workers} worker(s)")
+
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([self._fd], [], [], self.debounce / 2)
+                if readable:
+                    self._read_events()
+                self._submit_ready_files()
+        finally:
+            for _ in threads:
+                self._work_queue.put(None)
+            for thread in threads:
+                thread.join()
+            os.close(self._fd)
+
+    def stop(self):
+        self._stop.set()
+
+    def _add_watch_tree(self, folder):
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), mask)
+        if wd < 0:
+            self._report_error(f"Cannot watch {folder}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._watches[wd] = folder
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self._add_watch_tree(entry.path)
+
+    def _read_events(self):
+        data = os.read(self._fd, 64 * 1024)
+        now = time.monotonic()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                # The kernel dropped events while we were applying backpressure, close-writes included
+                for pending in self._pending.values():
+                    if pending[1] == 'writing':
+                        pending[1] = 'found'
+                self._rescan()
+                with self._submitted_lock:
+                    for submitted_path in [path for path in self._submitted if not os.path.exists(path)]:
+                        del self._submitted[submitted_path]
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            folder = self._watches.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watch_tree(path)
+                    self._rescan(path)
+                continue
+            if not self._is_input_file(path):
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(path, None)
+                with self._submitted_lock:
+                    self._submitted.pop(path, None)
+                continue
+            write_state = 'closed' if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) else 'writing'
+            self._pending[path] = [now, write_state, None]
+
+    def _rescan(self, folder=None):
+        now = time.monotonic()
+        for root_dir, _, files in os.walk(folder or self.watch_folder):
+            for file in files:
+                path = os.path.join(root_dir, file)
+                if self._is_input_file(path) and path not in self._pending:
+                    self._pending[path] = [now, 'found', None]
+
+    def _submit_ready_files(self):
+        now = time.monotonic()
+        for path, pending in list(self._pending.items()):
+            last_event, write_state, last_size = pending
+            if write_state == 'writing' or now - last_event < self.debounce:
+                continue
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+
+            # Without a writer to watch, the size has to hold still across a full debounce interval
+            if write_state == 'found' and stat.st_size != last_size:
+                pending[0], pending[2] = now, stat.st_size
+                continue
+
+            del self._pending[path]
+            signature = (stat.st_size, stat.st_mtime)
+            with self._submitted_lock:
+                if self._submitted.get(path) == signature:
+                    continue
+            # Files compressed before a restart (or already compressed under another event) are skipped
+            if self._is_up_to_date(path, stat):
+                continue
+            with self._submitted_lock:
+                self._submitted[path] = signature
+
+            # Blocks while the workers are saturated; inotify keeps buffering events meanwhile
+            while not self._stop.is_set():
+                try:
+                    self._work_queue.put((path, signature), timeout=self.debounce)
+                    break
+                except queue.Full:
+                    continue
+
+    def _work(self):
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                return
+            input_path, signature = item
+            output_path = self._output_path(input_path)
+            try:
+                if input_path.lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
+                    compress_image_admitted(
+                        self._admission,
+                        input_path,
+                        output_path,
+                        target_percentage=self.options['image_size_percentage'],
+                        png_quantize=self.options.get('png_quantize', False),
+                        error_log_callback=self.error_log_callback
+                    )
+                else:
+                    process_media_file(input_path, output_path, self.options, error_log_callback=self.error_log_callback)
+                self._report_status(f"Successfully compressed: {os.path.basename(input_path)}")
+            except Exception as e:
+                self._report_error(f"Error processing {os.path.basename(input_path)}: {str(e)}")
+                continue
+
+            # The output now marks the file as done; failed files stay listed until they change or go away
+            with self._submitted_lock:
+                if self._submitted.get(input_path) == signature:
+                    del self._submitted[input_path]
+
+    def _output_path(self, input_path):
+        return build_output_path(
+            input_path,
+            self.options['output_folder'],
+            self.options['image_format'],
+            self.options['video_format'],
+            self.options['audio_format']
+        )
+
+    def _is_up_to_date(self, input_path, stat):
+        # ctime also moves when a file is copied in with its original mtime preserved
+        try:
+            return os.stat(self._output_path(input_path)).st_mtime >= max(stat.st_mtime, stat.st_ctime)
+        except FileNotFoundError:
+            return False
+
+    def _is_input_file(self, path):
+        # Our own outputs and previews may land inside the watched folder
+        name = os.path.splitext(os.path.basename(path))[0]
+        return is_supported_file(path) and not name.endswith(('_compressed', '_preview'))
+
+    def _report_status(self, message):
+        if self.status_callback:
+            self.status_callback(message)
+
+    def _report_error(self, message):
+        if self.error_log_callback:
+            self.error_log_callback(message)
+
+
 # Custom QLabel for Drag and Drop
 class DropLabel(QLabel):
     files_dropped = Signal(list)
@@ -564,6 +2281,11 @@ class MediaCompressorApp(QMainWindow):
         self.image_size_slider.valueChanged.connect(self.update_image_size_label)
         self.image_size_layout.addWidget(self.image_size_slider)
 
+        # Lossy PNG Checkbox
+        self.png_quantize_checkbox = QCheckBox("Reduce PNG Colours (Lossy)")
+        self.png_quantize_checkbox.setToolTip("Map PNG output onto a palette sized by the slider when that is smaller. PNGs stay lossless otherwise.")
+        self.image_layout.addWidget(self.png_quantize_checkbox)
+
         # Video Options
         self.video_layout = QVBoxLayout()
         self.image_video_layout.addLayout(self.video_layout)
@@ -583,6 +2305,18 @@ class MediaCompressorApp(QMainWindow):
         self.video_format_combo.addItems(['mp4', 'mkv', 'avi', 'mov', 'mp3'])  # 'mp3' for audio extraction
         self.video_format_layout.addWidget(self.video_format_combo)
 
+        # Video Codec (only the engines the local FFmpeg build can encode with)
+        self.video_codec_layout = QHBoxLayout()
+        self.video_layout.addLayout(self.video_codec_layout)
+
+        self.video_codec_label = QLabel("Codec:")
+        self.video_codec_layout.addWidget(self.video_codec_label)
+
+        self.video_codec_combo = QComboBox()
+        for engine in available_video_engines() or [VIDEO_CODEC_ENGINES['h264']]:
+            self.video_codec_combo.addItem(engine.label, engine.name)
+        self.video_codec_layout.addWidget(self.video_codec_combo)
+
         # Video Size Slider
         self.video_size_layout = QHBoxLayout()
         self.video_layout.addLayout(self.video_size_layout)
@@ -597,6 +2331,28 @@ class MediaCompressorApp(QMainWindow):
         self.video_size_slider.valueChanged.connect(self.update_video_size_label)
         self.video_size_layout.addWidget(self.video_size_slider)
 
+        # Deadline for the whole batch; the encoder preset is picked to finish in time
+        self.video_deadline_layout = QHBoxLayout()
+        self.video_layout.addLayout(self.video_deadline_layout)
+
+        self.video_deadline_label = QLabel("Deadline (min):")
+        self.video_deadline_layout.addWidget(self.video_deadline_label)
+
+        self.video_deadline_combo = QComboBox()
+        self.video_deadline_combo.addItems(['None', '15', '30', '60', '120', '480'])
+        self.video_deadline_combo.setToolTip("Pick the slowest (best compressing) encoder preset that still finishes the batch in time.")
+        self.video_deadline_layout.addWidget(self.video_deadline_combo)
+
+        # Pooled Size Checkbox
+        self.video_pool_checkbox = QCheckBox("Apply Size to All Videos Combined")
+        self.video_pool_checkbox.setToolTip("Treat the size as a total for the whole selection and give complex videos more of it than static ones.")
+        self.video_layout.addWidget(self.video_pool_checkbox)
+
+        # Preview Contact Sheet Checkbox
+        self.generate_previews_checkbox = QCheckBox("Generate Preview Contact Sheets")
+        self.generate_previews_checkbox.setToolTip("Save a tiled keyframe preview next to each compressed video, in the image format.")
+        self.video_layout.addWidget(self.generate_previews_checkbox)
+
         # Spacer to push options to the top
         self.image_video_layout.addSpacerItem(QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding))
 
@@ -656,20 +2412,14 @@ class MediaCompressorApp(QMainWindow):
 
 
     def get_config_file_path(self):
-        if sys.platform.startswith('win'):
-            config_dir = os.path.join(os.getenv('APPDATA'), 'MediaCompressor')
-        elif sys.platform.startswith('darwin'):
-            config_dir = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'MediaCompressor')
-        else:
-            config_dir = os.path.join(os.path.expanduser('~'), '.config', 'MediaCompressor')
-        os.makedirs(config_dir, exist_ok=True)
-        return os.path.join(config_dir, 'settings.ini')
+        return os.path.join(get_config_dir(), 'settings.ini')
 
     def load_config(self):
         if os.path.exists(self.config_file):
             self.config.read(self.config_file)
         else:
-            self.config['Settings'] = {}
+            # memory_budget_mb = 0 lets image jobs use half of physical memory
+            self.config['Settings'] = {'memory_budget_mb': '0'}
             with open(self.config_file, 'w') as f:
                 self.config.write(f)
 
@@ -756,24 +2506,28 @@ class MediaCompressorApp(QMainWindow):
                 self.log_error("Folder creation was cancelled by the user.")
                 return
 
+        # Check the codec fits the container before starting a long batch
+        video_format = self.video_format_combo.currentText()
+        engine = VIDEO_CODEC_ENGINES[self.video_codec_combo.currentData()]
+        if video_format != 'mp3' and not engine.supports_container(video_format):
+            self.update_status(f"{engine.label} cannot be exported as .{video_format}.")
+            self.log_error(f"{engine.label} supports these formats: {', '.join(engine.containers)}")
+            return
+
         # Prepare output paths
         files_to_process = []
         for file_path in self.input_files:
             try:
-                if file_path.lower().endswith(('png', 'jpg', 'jpeg', 'webp')):
-                    default_extension = '.' + self.image_format_combo.currentText()
-                elif file_path.lower().endswith(('mp4', 'mov', 'avi', 'mkv', 'mp3')):
-                    default_extension = '.' + self.video_format_combo.currentText()
-                elif file_path.lower().endswith(('mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a')):
-                    default_extension = '.' + self.audio_format_combo.currentText()
-                else:
+                output_path = build_output_path(
+                    file_path,
+                    output_folder,
+                    self.image_format_combo.currentText(),
+                    self.video_format_combo.currentText(),
+                    self.audio_format_combo.currentText()
+                )
+                if output_path is None:
                     continue
 
-                base_name = os.path.basename(file_path)
-                name, _ = os.path.splitext(base_name)
-                suggested_name = f"{name}_compressed{default_extension}"
-
-                output_path = os.path.join(output_folder, suggested_name)
                 files_to_process.append((file_path, output_path))
 
             except Exception as e:
@@ -797,7 +2551,14 @@ class MediaCompressorApp(QMainWindow):
             'video_size_percentage': self.video_size_slider.value(),
             'audio_bitrate': self.audio_bitrate_combo.currentText(),  # Dynamically fetched bitrate
             'output_folder': output_folder,
-            'high_quality_audio': self.high_quality_audio_checkbox.isChecked()
+            'high_quality_audio': self.high_quality_audio_checkbox.isChecked(),
+            'video_codec': self.video_codec_combo.currentData(),
+            'generate_previews': self.generate_previews_checkbox.isChecked(),
+            'png_quantize': self.png_quantize_checkbox.isChecked(),
+            'video_pool_budget': self.video_pool_checkbox.isChecked(),
+            'image_format': self.image_format_combo.currentText(),
+            'video_deadline_minutes': None if self.video_deadline_combo.currentText() == 'None' else int(self.video_deadline_combo.currentText()),
+            'memory_budget_mb': self.config.getint('Settings', 'memory_budget_mb', fallback=0) or None
         }
 
 
@@ -835,15 +2596,71 @@ class MediaCompressorApp(QMainWindow):
             QMessageBox.warning(self, "Completed with Errors", "Compression completed with some errors.")
 
     def is_supported_file(self, file_path):
-        supported_extensions = (
-            '.png', '.jpg', '.jpeg', '.webp',
-            '.mp4', '.mov', '.avi', '.mkv',
-            '.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'
-        )
-        return file_path.lower().endswith(supported_extensions)
+        return is_supported_file(file_path)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Media Compressor")
+    parser.add_argument('--serve', action='store_true', help="Run as a local compression daemon instead of the GUI")
+    parser.add_argument('--host', default='127.0.0.1', help="Address the daemon listens on")
+    parser.add_argument('--port', type=int, default=8765, help="Port the daemon listens on")
+    parser.add_argument('--output-root', metavar='FOLDER', help="Only let daemon jobs write inside FOLDER")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes or threads")
+    parser.add_argument('--watch', metavar='FOLDER', help="Compress files dropped into FOLDER as they arrive")
+    parser.add_argument('--output', metavar='FOLDER', help="Output folder for watch mode")
+    parser.add_argument('--queue-size', type=int, default=64, help="Maximum number of files waiting for a watch worker")
+    parser.add_argument('--image-format', default=DEFAULT_OPTIONS['image_format'])
+    parser.add_argument('--video-format', default=DEFAULT_OPTIONS['video_format'])
+    parser.add_argument('--audio-format', default=DEFAULT_OPTIONS['audio_format'])
+    parser.add_argument('--image-size', type=int, default=DEFAULT_OPTIONS['image_size_percentage'])
+    parser.add_argument('--video-size', type=int, default=DEFAULT_OPTIONS['video_size_percentage'])
+    parser.add_argument('--audio-bitrate', default=DEFAULT_OPTIONS['audio_bitrate'])
+    parser.add_argument('--memory-budget-mb', type=int, default=None, help="RAM budget for image jobs (default: half of physical memory)")
+    parser.add_argument('--previews', action='store_true', help="Save a keyframe contact sheet next to each compressed video")
+    parser.add_argument('--png-quantize', action='store_true', help="Allow lossy palette quantization of PNG output, sized by --image-size")
+    args, qt_args = parser.parse_known_args()
+
+    if args.watch:
+        if not args.output:
+            parser.error("--watch requires --output")
+        options = dict(DEFAULT_OPTIONS)
+        options.update({
+            'image_size_percentage': args.image_size,
+            'video_size_percentage': args.video_size,
+            'audio_bitrate': args.audio_bitrate,
+            'output_folder': args.output,
+            'image_format': args.image_format,
+            'video_format': args.video_format,
+            'audio_format': args.audio_format,
+            'generate_previews': args.previews,
+            'png_quantize': args.png_quantize,
+            'memory_budget_mb': args.memory_budget_mb
+        })
+        try:
+            check_ffmpeg_installed()
+            os.makedirs(args.output, exist_ok=True)
+            watcher = FolderWatcher(args.watch, options, workers=args.workers, queue_size=args.queue_size,
+                                    status_callback=print, error_log_callback=print)
+            watcher.run()
+        except EnvironmentError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.serve:
+        if args.host not in ('127.0.0.1', 'localhost', '::1') and not args.output_root:
+            parser.error("--host other than localhost requires --output-root")
+        try:
+            serve(args.host, args.port, args.workers, args.memory_budget_mb, args.output_root)
+        except EnvironmentError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+        return
+
+    sys.argv = sys.argv[:1] + qt_args
+
     try:
         check_ffmpeg_installed()
     except EnvironmentError as e:
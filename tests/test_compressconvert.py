@@ -0,0 +1,418 @@
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import compressconvert as cc
+
+
+# Image admission control
+
+def run_admitted(controller, estimates, hold=0.01):
+    """Admit every estimate on its own thread; returns the peak reserved total and peak oversized count."""
+    lock = threading.Lock()
+    in_use = oversized = peak = peak_oversized = 0
+
+    def job(estimate):
+        nonlocal in_use, oversized, peak, peak_oversized
+        is_oversized = estimate > controller.oversized_threshold
+        with controller.admit(estimate):
+            with lock:
+                in_use += min(estimate, controller.memory_budget)
+                oversized += is_oversized
+                peak = max(peak, in_use)
+                peak_oversized = max(peak_oversized, oversized)
+            time.sleep(hold)
+            with lock:
+                in_use -= min(estimate, controller.memory_budget)
+                oversized -= is_oversized
+
+    threads = [threading.Thread(target=job, args=(estimate,)) for estimate in estimates]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+    return peak, peak_oversized
+
+
+def test_admission_never_exceeds_budget():
+    controller = cc.ImageAdmissionController(100)
+    estimates = [random.Random(index).randint(1, 45) for index in range(40)]
+
+    peak, _ = run_admitted(controller, estimates)
+
+    assert 0 < peak <= 100
+
+
+def test_oversized_images_run_one_at_a_time():
+    controller = cc.ImageAdmissionController(100)
+    # 500 is larger than the whole budget and still has to be admitted, alone
+    estimates = [60, 70, 500, 10, 20, 80, 10]
+
+    peak, peak_oversized = run_admitted(controller, estimates)
+
+    assert peak <= 100
+    assert peak_oversized == 1
+
+
+def test_image_memory_estimate_counts_decoded_copies():
+    jpeg = cc.estimate_image_memory(1000, 1000, 'RGB', 'jpg')
+    png = cc.estimate_image_memory(1000, 1000, 'RGB', 'png')
+
+    assert jpeg >= 1000 * 1000 * 4
+    assert png > jpeg
+
+
+# PNG optimization
+
+def png_round_trip(img, **kwargs):
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    with Image.open(io.BytesIO(buffer.getvalue())) as source:
+        source.load()
+        data = cc.optimize_png(source, **kwargs)
+    result = Image.open(io.BytesIO(data))
+    result.load()
+    return result
+
+
+def gradient(mode, size=(64, 64)):
+    img = Image.new(mode, size)
+    img.putdata([
+        tuple(((x * 4 + y * band * 2) % 256) for band in range(len(mode)))
+        for y in range(size[1]) for x in range(size[0])
+    ])
+    return img
+
+
+def test_png_keeps_rgb_colour_key_transparency():
+    img = Image.new('RGB', (32, 32), (255, 0, 0))
+    img.paste((0, 0, 255), (8, 8, 24, 24))
+    img.info['transparency'] = (255, 0, 0)
+
+    result = png_round_trip(img)
+
+    assert result.convert('RGBA').getpixel((0, 0))[3] == 0
+    assert result.convert('RGBA').getpixel((16, 16)) == (0, 0, 255, 255)
+
+
+def test_png_keeps_la_alpha():
+    img = gradient('LA')
+
+    result = png_round_trip(img)
+
+    assert result.convert('RGBA').tobytes() == img.convert('RGBA').tobytes()
+
+
+def test_png_drops_alpha_of_opaque_rgba():
+    img = gradient('RGBA')
+    img.putalpha(255)
+
+    result = png_round_trip(img)
+
+    assert 'A' not in result.getbands() and 'transparency' not in result.info
+    assert result.convert('RGB').tobytes() == img.convert('RGB').tobytes()
+
+
+def test_png_stays_lossless_unless_quantization_is_asked_for():
+    # Noise compresses poorly, so a small palette is always the smaller encoding
+    img = Image.frombytes('RGB', (128, 128), random.Random(0).randbytes(128 * 128 * 3))
+
+    lossless = png_round_trip(img, target_percentage=10)
+    quantized = png_round_trip(img, target_percentage=10, quantize=True)
+
+    assert lossless.convert('RGB').tobytes() == img.tobytes()
+    assert quantized.mode == 'P'
+    assert len(quantized.getcolors(256)) <= 25
+
+
+# Compression daemon
+
+def test_job_entries_need_string_paths(tmp_path):
+    options = dict(cc.DEFAULT_OPTIONS, output_folder=str(tmp_path))
+
+    with pytest.raises(ValueError):
+        cc.build_job_entries([[1, str(tmp_path / 'o.jpg')]], options)
+    with pytest.raises(ValueError):
+        cc.build_job_entries([['/in/a.png']], options)
+    with pytest.raises(ValueError):
+        cc.build_job_entries([], options)
+
+
+def test_job_outputs_stay_inside_the_output_folder(tmp_path):
+    output_folder = tmp_path / 'out'
+    output_folder.mkdir()
+    (output_folder / 'escape').symlink_to(tmp_path)
+    options = dict(cc.DEFAULT_OPTIONS, output_folder=str(output_folder))
+
+    entries = cc.build_job_entries(['/in/a.png', ['/in/b.png', str(output_folder / 'b.jpg')]], options)
+    assert [entry['output'] for entry in entries] == [str(output_folder / 'a_compressed.jpg'), str(output_folder / 'b.jpg')]
+
+    for output_path in ('/etc/passwd', str(output_folder / '..' / 'b.jpg'), str(output_folder / 'escape' / 'b.jpg')):
+        with pytest.raises(ValueError):
+            cc.build_job_entries([['/in/b.png', output_path]], options)
+    with pytest.raises(ValueError):
+        cc.build_job_entries(['/in/a.png'], dict(cc.DEFAULT_OPTIONS, output_folder=None))
+    with pytest.raises(ValueError):
+        cc.build_job_entries(['/in/a.png'], options, output_root=str(tmp_path / 'root'))
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    # Worker processes are forked from the test process and inherit the stub
+    monkeypatch.setattr(cc, 'check_ffmpeg_installed', lambda: None)
+    daemon = cc.CompressionDaemon(workers=1)
+    yield daemon
+    daemon.shutdown()
+
+
+def test_daemon_rejects_invalid_jobs_without_registering_them(daemon, tmp_path):
+    with pytest.raises(ValueError):
+        daemon.submit([[1, str(tmp_path / 'o.jpg')]], {'output_folder': str(tmp_path)})
+    with pytest.raises(ValueError):
+        daemon.submit([], {'output_folder': str(tmp_path)})
+
+    assert daemon.summary() == []
+
+
+def test_daemon_runs_image_jobs(daemon, tmp_path):
+    gradient('RGB').save(tmp_path / 'a.png')
+
+    job_id = daemon.submit([str(tmp_path / 'a.png')], {'output_folder': str(tmp_path)})
+    events = list(daemon.events(job_id))
+
+    assert events[-1]['event'] == 'done'
+    assert daemon.summary(job_id)[0]['state'] == 'done'
+    assert os.path.exists(tmp_path / 'a_compressed.jpg')
+
+
+def test_daemon_http_refuses_browser_requests(daemon, tmp_path):
+    handler = type('TestHandler', (cc.DaemonRequestHandler,), {'compression_daemon': daemon})
+    server = cc.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    body = json.dumps({'files': ['/in/a.png'], 'options': {'output_folder': str(tmp_path)}})
+
+    def post(headers, payload=body):
+        connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+        connection.request('POST', '/jobs', payload, headers)
+        return connection.getresponse().status
+
+    try:
+        assert post({'Content-Type': 'text/plain'}) == 415
+        assert post({'Content-Type': 'application/json', 'Origin': 'https://example.com'}) == 403
+        assert post({'Content-Type': 'application/json'}, json.dumps({'files': [[1, '/tmp/o.jpg']]})) == 400
+        assert post({'Content-Type': 'application/json'}, '[]') == 400
+        assert daemon.summary() == []
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Watch folder
+
+@pytest.fixture
+def watcher(tmp_path):
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'out').mkdir()
+    options = dict(cc.DEFAULT_OPTIONS, output_folder=str(tmp_path / 'out'))
+    watcher = cc.FolderWatcher(str(tmp_path / 'in'), options, debounce=0)
+    yield watcher
+    os.close(watcher._fd)
+
+
+def queued_paths(watcher):
+    paths = []
+    while not watcher._work_queue.empty():
+        paths.append(watcher._work_queue.get()[0])
+    return paths
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="watch mode needs inotify")
+def test_watched_files_wait_for_close_write(watcher):
+    path = os.path.join(watcher.watch_folder, 'slow.png')
+    gradient('RGB').save(path)
+
+    watcher._pending[path] = [0, 'writing', None]
+    watcher._submit_ready_files()
+    assert queued_paths(watcher) == []
+
+    watcher._pending[path] = [0, 'closed', None]
+    watcher._submit_ready_files()
+    assert queued_paths(watcher) == [path]
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="watch mode needs inotify")
+def test_rescan_skips_files_with_up_to_date_output(watcher):
+    done = os.path.join(watcher.watch_folder, 'done.png')
+    new = os.path.join(watcher.watch_folder, 'new.png')
+    gradient('RGB').save(done)
+    gradient('RGB').save(new)
+    gradient('RGB').save(watcher._output_path(done))
+
+    watcher._rescan()
+    # Found files need their size to hold still across two passes
+    watcher._submit_ready_files()
+    watcher._submit_ready_files()
+
+    assert queued_paths(watcher) == [new]
+
+
+# Deadline-driven preset selection
+
+THROUGHPUT = {'ultrafast': 1000.0, 'medium': 100.0, 'veryslow': 10.0}
+
+
+def test_scheduler_picks_slowest_preset_that_fits():
+    assert cc.PresetScheduler(THROUGHPUT, 1000, 200).select_preset() == 'veryslow'
+    assert cc.PresetScheduler(THROUGHPUT, 1000, 50).select_preset() == 'medium'
+    # Nothing fits, so the fastest preset is the best effort
+    assert cc.PresetScheduler(THROUGHPUT, 1000, 0.5).select_preset() == 'ultrafast'
+
+
+def test_scheduler_deadline_counts_from_batch_start():
+    started = time.monotonic() - 150
+    assert cc.PresetScheduler(THROUGHPUT, 1000, 200, started=started).select_preset() == 'medium'
+
+
+def test_scheduler_learns_from_finished_files():
+    scheduler = cc.PresetScheduler(THROUGHPUT, 5000, 100)
+    assert scheduler.select_preset() == 'medium'
+
+    # Files encode ten times slower than the calibration clip predicted
+    scheduler.record('medium', 1000, 100)
+    assert scheduler.remaining_pixels == 4000
+    assert scheduler.speed_factor == pytest.approx(0.55)
+    assert scheduler.select_preset() == 'medium'
+
+    scheduler.record('medium', 1000, 100)
+    assert scheduler.select_preset() == 'ultrafast'
+
+
+def test_scheduler_ignores_speed_of_failed_files():
+    scheduler = cc.PresetScheduler(THROUGHPUT, 1000, 100)
+
+    scheduler.record('medium', 600, 0)
+
+    assert scheduler.remaining_pixels == 400
+    assert scheduler.speed_factor == 1.0
+
+
+# Batched audio transcoding
+
+class FakeFFmpeg:
+    """Stands in for subprocess.run; inputs named bad* can't be opened, and disk_full fails every run."""
+
+    def __init__(self, disk_full=False, old_style=False):
+        self.disk_full = disk_full
+        self.old_style = old_style
+        self.runs = 0
+
+    def __call__(self, command, **kwargs):
+        self.runs += 1
+        inputs = [command[index + 1] for index, arg in enumerate(command) if arg == '-i']
+        if self.disk_full:
+            return subprocess.CompletedProcess(command, 1, stderr="Error writing trailer: No space left on device\n")
+        for index, input_path in enumerate(inputs):
+            if os.path.basename(input_path).startswith('bad'):
+                if self.old_style:
+                    stderr = f"{input_path}: Invalid data found when processing input\n"
+                else:
+                    stderr = (f"[in#{index} @ 0x5600] Error opening input: Invalid data found when processing input\n"
+                              f"Error opening input file {input_path}.\n"
+                              "Error opening input files: Invalid data found when processing input\n")
+                return subprocess.CompletedProcess(command, 1, stderr=stderr)
+        return subprocess.CompletedProcess(command, 0, stderr='')
+
+
+def run_audio_batch(monkeypatch, names, **fake_options):
+    fake = FakeFFmpeg(**fake_options)
+    monkeypatch.setattr(cc.subprocess, 'run', fake)
+    results = {}
+    jobs = [(f'/in/{name}.wav', f'/out/{name}_compressed.mp3') for name in names]
+    cc._run_audio_batch(jobs, 128, lambda input_path, error: results.setdefault(os.path.basename(input_path), error), None)
+    return fake.runs, results
+
+
+@pytest.mark.parametrize('old_style', [False, True])
+def test_audio_batch_isolates_a_bad_file(monkeypatch, old_style):
+    runs, results = run_audio_batch(monkeypatch, ['a', 'b', 'bad', 'c', 'd'], old_style=old_style)
+
+    assert runs == 2
+    assert isinstance(results.pop('bad.wav'), RuntimeError)
+    assert results == {'a.wav': None, 'b.wav': None, 'c.wav': None, 'd.wav': None}
+
+
+def test_audio_batch_runs_each_file_alone_when_no_file_is_named(monkeypatch):
+    runs, results = run_audio_batch(monkeypatch, ['a', 'b', 'c', 'd'], disk_full=True)
+
+    assert runs == 1 + 4
+    assert len(results) == 4 and all(isinstance(error, RuntimeError) for error in results.values())
+
+
+def test_audio_batch_checks_output_format_once(monkeypatch):
+    fake = FakeFFmpeg()
+    monkeypatch.setattr(cc.subprocess, 'run', fake)
+    monkeypatch.setattr(cc, 'check_audio_output', lambda output_format: "cannot write aac as .ogg")
+    results = {}
+    jobs = [(f'/in/{name}.wav', f'/out/{name}_compressed.ogg') for name in 'abc']
+
+    cc.compress_audio_batch(jobs, completion_callback=lambda input_path, error: results.setdefault(input_path, error))
+
+    assert fake.runs == 0
+    assert len(results) == 3 and all(isinstance(error, RuntimeError) for error in results.values())
+
+
+# Pooled video bitrates
+
+def total_bytes(videos, bitrates, audio_bitrate):
+    return sum((bitrates[path] + audio_bitrate) * duration for path, duration, _ in videos) / 8
+
+
+def test_allocation_is_proportional_to_complexity():
+    videos = [('a', 10, 1.0), ('b', 10, 3.0)]
+    bitrates = cc.allocate_batch_bitrates(videos, 5_000_000, 128000)
+
+    assert bitrates['b'] == pytest.approx(3 * bitrates['a'])
+    assert total_bytes(videos, bitrates, 128000) == pytest.approx(5_000_000)
+
+
+def test_max_clamp_is_redistributed_before_min_clamp():
+    # A 60 Mbit/s pool over 10 s: b overshoots the cap, and the bits it frees
+    # must lift a and c back into range instead of clamping them to the floor
+    videos = [('a', 10, 1.0), ('b', 10, 1e6), ('c', 10, 10.0)]
+    bitrates = cc.allocate_batch_bitrates(videos, 75_000_000, 0)
+
+    assert bitrates['b'] == cc.MAX_VIDEO_BITRATE
+    assert bitrates['c'] == pytest.approx(10 * bitrates['a'])
+    assert bitrates['c'] == pytest.approx(9_090_909, rel=1e-3)
+    assert total_bytes(videos, bitrates, 0) == pytest.approx(75_000_000)
+
+
+def test_min_clamp_takes_bits_from_other_videos():
+    videos = [('a', 10, 1.0), ('b', 10, 1000.0)]
+    bitrates = cc.allocate_batch_bitrates(videos, 5_000_000, 0)
+
+    assert bitrates['a'] == cc.MIN_VIDEO_BITRATE
+    assert bitrates['b'] == pytest.approx(4_000_000 - cc.MIN_VIDEO_BITRATE)
+    assert total_bytes(videos, bitrates, 0) == pytest.approx(5_000_000)
+
+
+def test_bitrates_stay_within_clamps():
+    videos = [('a', 10, 1.0), ('b', 10, 2.0), ('c', 5, 50.0)]
+    for target in (1_000, 5_000_000, 10_000_000_000):
+        bitrates = cc.allocate_batch_bitrates(videos, target, 128000)
+        assert set(bitrates) == {'a', 'b', 'c'}
+        assert all(cc.MIN_VIDEO_BITRATE <= rate <= cc.MAX_VIDEO_BITRATE for rate in bitrates.values())
+
+
+def test_videos_without_duration_are_skipped():
+    assert cc.allocate_batch_bitrates([('a', 0, 1.0)], 1_000_000, 128000) == {}